@@ -0,0 +1,229 @@
+# ---------------------------------------------------------------------------
+# Token‑budgeted context assembly for the /ask prompt
+# ---------------------------------------------------------------------------
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+import tiktoken
+
+# Max. number of tokens the retrieved excerpts may occupy in the prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Tokenizer used for counting – matches the default OpenAI model in llm_loader
+TOKENIZER_MODEL      = os.getenv("CONTEXT_TOKENIZER_MODEL", "gpt-4o-mini")
+# Shortest word overlap that counts as "the same span" when stitching chunks
+MIN_OVERLAP_WORDS    = 5
+
+CHUNK_SEPARATOR = "\n\n"
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> tiktoken.Encoding | None:
+    """
+    Load the tiktoken encoding once. tiktoken downloads its BPE files on
+    first use, so offline deployments fall back to an estimate (None) –
+    token counting must never break answering.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        print("⚠️ tiktoken unavailable, estimating tokens:", exc)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Return the number of tokens *text* occupies for the configured model.
+    Approximate for non-OpenAI models (e.g. Ollama) and when tiktoken is
+    unavailable, where ~4/3 tokens per word is assumed.
+    """
+    enc = _encoding()
+    if enc is None:
+        return -(-len(text.split()) * 4 // 3)
+    return len(enc.encode(text))
+
+
+# ───────────────────────── merging helpers ──────────────────────────
+def _word_overlap(left: List[str], right: List[str]) -> int:
+    """Length of the longest suffix of *left* that is also a prefix of *right*."""
+    for k in range(min(len(left), len(right)), MIN_OVERLAP_WORDS - 1, -1):
+        if left[-k:] == right[:k]:
+            return k
+    return 0
+
+
+def _find(haystack: List[str], needle: List[str]) -> int:
+    """Index where the word sequence *needle* starts in *haystack*, or -1."""
+    n = len(needle)
+    for i in range(len(haystack) - n + 1):
+        if haystack[i : i + n] == needle:
+            return i
+    return -1
+
+
+def _merge_words(left: List[str], right: List[str]) -> Tuple[List[str], int, int] | None:
+    """
+    Stitch two word sequences together if they overlap or one contains the
+    other. Returns (merged words, offset of left, offset of right) or *None*
+    when the spans are unrelated.
+    """
+    i = _find(left, right)
+    if i >= 0:
+        return left, 0, i
+    i = _find(right, left)
+    if i >= 0:
+        return right, i, 0
+    k = _word_overlap(left, right)
+    if k:
+        return left + right[k:], 0, len(left) - k
+    k = _word_overlap(right, left)
+    if k:
+        return right + left[k:], len(right) - k, 0
+    return None
+
+
+class _Span:
+    """Words of one excerpt plus the position of its best-ranked chunk."""
+    def __init__(self, rank: int, words: List[str]) -> None:
+        self.rank = rank
+        self.words = words
+        self.anchor = (0, len(words))   # [start, end) of the best chunk's words
+
+
+def _merge_group(spans: List[_Span]) -> List[_Span]:
+    """
+    Repeatedly merge spans of one source/page until nothing overlaps
+    anymore. A merged span keeps the rank and anchor of its best part.
+    """
+    spans = [s for s in spans if s.words]
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(spans)):
+            for j in range(i + 1, len(spans)):
+                a, b = spans[i], spans[j]
+                stitched = _merge_words(a.words, b.words)
+                if stitched is not None:
+                    words, off_a, off_b = stitched
+                    best, off = (a, off_a) if a.rank <= b.rank else (b, off_b)
+                    span = _Span(best.rank, words)
+                    span.anchor = (best.anchor[0] + off, best.anchor[1] + off)
+                    spans[i] = span
+                    del spans[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return spans
+
+
+def _truncate(span: _Span, max_tokens: int) -> str:
+    """
+    Cut *span* to at most *max_tokens* tokens on word boundaries, keeping the
+    words of its best-ranked chunk and growing around them to both sides.
+    """
+    words = span.words
+    if _encoding() is None:
+        cost = [4 / 3] * len(words)
+    else:
+        cost = [count_tokens(" " + w) for w in words]
+    start, end = span.anchor
+    used = 0
+
+    # the best chunk itself, from its start, as far as it fits
+    stop = start
+    while stop < end and used + cost[stop] <= max_tokens:
+        used += cost[stop]
+        stop += 1
+    end = stop
+
+    # then context to the left and right, alternately
+    if end == span.anchor[1]:
+        grew = True
+        while grew:
+            grew = False
+            if start > 0 and used + cost[start - 1] <= max_tokens:
+                start -= 1
+                used += cost[start]
+                grew = True
+            if end < len(words) and used + cost[end] <= max_tokens:
+                used += cost[end]
+                end += 1
+                grew = True
+
+    # per-word costs are an estimate of the joined text – trim if over
+    while end > start and count_tokens(" ".join(words[start:end])) > max_tokens:
+        if start < span.anchor[0]:
+            start += 1
+        else:
+            end -= 1
+    return " ".join(words[start:end])
+
+
+# ───────────────────────── public API ───────────────────────────────
+def build_context(
+    results: List[Dict[str, Any]],
+    budget: int = CONTEXT_TOKEN_BUDGET,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Turn retrieved chunks (ordered by relevance) into a prompt context.
+
+    - chunks from the same source/page are merged, so the 50‑word overlap
+      of the chunker and exact duplicates are sent only once
+    - the merged excerpts are added in relevance order until *budget*
+      tokens are used; the excerpt that does not fit is truncated around
+      the words of its best-ranked chunk
+
+    Returns the context string and token stats:
+    {"raw_tokens", "context_tokens", "dedup_saved", "truncated", "budget"}
+    where *dedup_saved* are tokens removed by merging and *truncated* are
+    tokens dropped to stay within the budget.
+    """
+    raw_tokens = count_tokens(CHUNK_SEPARATOR.join(r["chunk"] for r in results))
+
+    # Group by (source, page), remembering each chunk's relevance rank
+    groups: Dict[Tuple[Any, Any], List[_Span]] = {}
+    for rank, r in enumerate(results):
+        key = (r.get("source"), r.get("page"))
+        groups.setdefault(key, []).append(_Span(rank, r["chunk"].split()))
+
+    spans: List[_Span] = []
+    for group in groups.values():
+        spans.extend(_merge_group(group))
+    spans.sort(key=lambda s: s.rank)
+    excerpts = [" ".join(s.words) for s in spans]
+    deduped_tokens = count_tokens(CHUNK_SEPARATOR.join(excerpts))
+
+    # Fill the budget in relevance order
+    sep_tokens = count_tokens(CHUNK_SEPARATOR)
+    parts: List[str] = []
+    used = 0
+    for span, excerpt in zip(spans, excerpts):
+        cost = sep_tokens if parts else 0
+        tokens = count_tokens(excerpt)
+        remaining = budget - used - cost
+        if remaining <= 0:
+            break
+        if tokens > remaining:
+            cut = _truncate(span, remaining)
+            if cut:
+                parts.append(cut)
+            break
+        parts.append(excerpt)
+        used += cost + tokens
+
+    context = CHUNK_SEPARATOR.join(parts)
+    context_tokens = count_tokens(context)
+    stats = {
+        "raw_tokens":     raw_tokens,
+        "context_tokens": context_tokens,
+        "dedup_saved":    max(raw_tokens - deduped_tokens, 0),
+        "truncated":      max(deduped_tokens - context_tokens, 0),
+        "budget":         budget,
+    }
+    return context, stats
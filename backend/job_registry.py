@@ -1,24 +1,52 @@
 # ---------------------------------------------------------------------------
-# A thread‑safe, in‑memory registry that tracks long‑running background jobs 
+# A thread‑safe, in‑memory registry that tracks long‑running background jobs
 # ---------------------------------------------------------------------------
 from __future__ import annotations
 
+import asyncio
 import threading
 import time
 import uuid
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
-class JobRegistry:
+FINAL_STATES = {"done", "error"}
+
+class _Shard:
+    """One slice of the registry with its own lock, jobs and subscribers."""
     def __init__(self) -> None:
-        self._jobs: Dict[str, Dict[str, Any]] = {}
-        self._lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        # job_id → [(event loop of the subscriber, its queue)]
+        self.subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self.last_publish: Dict[str, float] = {}
+        # job_id → timer that publishes a throttled update once the interval ends
+        self.flush_timers: Dict[str, threading.Timer] = {}
+
+class JobRegistry:
+    def __init__(
+        self,
+        shards: int = 16,
+        max_jobs: int = 1000,
+        ttl_sec: int = 24 * 3600,
+        progress_interval_sec: float = 0.25,
+    ) -> None:
+        self._shards = [_Shard() for _ in range(shards)]
+        self._max_jobs = max_jobs
+        self._ttl_sec = ttl_sec
+        self._progress_interval = progress_interval_sec
+        self._last_cleanup = time.time()
+
+    def _shard(self, job_id: str) -> _Shard:
+        return self._shards[hash(job_id) % len(self._shards)]
 
     # ───────────────────────── CRUD helpers ──────────────────────────
     def create(self, filename: str) -> str:
         """Register a new job and return its unique job_id."""
+        self._auto_cleanup()
         job_id = str(uuid.uuid4())
-        with self._lock:
-            self._jobs[job_id] = {
+        shard = self._shard(job_id)
+        with shard.lock:
+            shard.jobs[job_id] = {
                 "file":        filename,
                 "created_at":  time.time(),
                 "state":       "queued",    # queued | parsing | chunking | embedding | storing | done | error
@@ -28,32 +56,175 @@ class JobRegistry:
         return job_id
 
     def update(self, job_id: str, **changes) -> None:
-        """Atomically merge *changes* (state, progress, error…) into the job dict."""
-        with self._lock:
-            if job_id in self._jobs:
-                self._jobs[job_id].update(changes)
+        """
+        Atomically merge *changes* (state, progress, error…) into the job dict
+        and notify subscribers. Pure progress/phase updates are coalesced: they
+        are published at most once per *progress_interval_sec*; a throttled
+        update is sent when the interval ends, so a stalled phase still shows
+        its latest progress.
+        """
+        shard = self._shard(job_id)
+        now = time.time()
+        with shard.lock:
+            job = shard.jobs.get(job_id)
+            if job is None:
+                return
+            state_changed = "state" in changes and changes["state"] != job["state"]
+            job.update(changes)
+            since_last = now - shard.last_publish.get(job_id, 0.0)
+            if (
+                not state_changed
+                and "error" not in changes
+                and since_last < self._progress_interval
+            ):
+                if job_id not in shard.flush_timers:
+                    timer = threading.Timer(self._progress_interval - since_last, self._flush, (job_id,))
+                    timer.daemon = True
+                    shard.flush_timers[job_id] = timer
+                    timer.start()
+                return
+            snapshot, subs = self._snapshot_locked(shard, job_id, now)
+        for loop, q in subs:
+            self._publish(loop, q, snapshot)
+
+    def _flush(self, job_id: str) -> None:
+        """Trailing edge of the coalescing: publish the latest throttled state."""
+        shard = self._shard(job_id)
+        with shard.lock:
+            if shard.flush_timers.pop(job_id, None) is None or job_id not in shard.jobs:
+                return
+            snapshot, subs = self._snapshot_locked(shard, job_id, time.time())
+        for loop, q in subs:
+            self._publish(loop, q, snapshot)
+
+    @staticmethod
+    def _snapshot_locked(shard: _Shard, job_id: str, now: float) -> tuple:
+        """Mark *job_id* as published; caller must hold *shard.lock*."""
+        timer = shard.flush_timers.pop(job_id, None)
+        if timer is not None:
+            timer.cancel()
+        shard.last_publish[job_id] = now
+        return dict(shard.jobs[job_id]), list(shard.subscribers.get(job_id, ()))
 
     def get(self, job_id: str) -> Dict[str, Any] | None:
-        """Return the job dict or *None* if the id is unknown."""
-        with self._lock:
-            return self._jobs.get(job_id)
+        """Return a copy of the job dict or *None* if the id is unknown."""
+        shard = self._shard(job_id)
+        with shard.lock:
+            job = shard.jobs.get(job_id)
+            return dict(job) if job is not None else None
 
     def delete(self, job_id: str) -> None:
-        """Remove a job from the registry."""
-        with self._lock:
-            self._jobs.pop(job_id, None)
+        """Remove a job from the registry and end any streams attached to it."""
+        shard = self._shard(job_id)
+        with shard.lock:
+            removed = self._pop_locked(shard, job_id)
+        self._notify_removed(removed)
+
+    @staticmethod
+    def _pop_locked(shard: _Shard, job_id: str) -> tuple:
+        """Drop a job and its subscribers; caller must hold *shard.lock*."""
+        job = shard.jobs.pop(job_id, None)
+        shard.last_publish.pop(job_id, None)
+        timer = shard.flush_timers.pop(job_id, None)
+        if timer is not None:
+            timer.cancel()
+        subs = shard.subscribers.pop(job_id, [])
+        return job, subs
+
+    def _notify_removed(self, removed: tuple) -> None:
+        """Send a terminal snapshot so subscribers of a removed job stop waiting."""
+        job, subs = removed
+        if job is None or not subs:
+            return
+        snapshot = dict(job)
+        if snapshot["state"] not in FINAL_STATES:
+            snapshot.update(state="error", error="Job was removed.")
+        for loop, q in subs:
+            self._publish(loop, q, snapshot)
+
+    # ───────────────────────── change events ────────────────────────
+    def subscribe(self, job_id: str) -> asyncio.Queue | None:
+        """
+        Return an asyncio.Queue that receives job snapshots on every published
+        change (call from inside the event loop). Only the latest snapshot is
+        kept, so slow consumers never pile up stale progress.
+        Returns *None* if the id is unknown.
+        """
+        loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        shard = self._shard(job_id)
+        with shard.lock:
+            job = shard.jobs.get(job_id)
+            if job is None:
+                return None
+            shard.subscribers.setdefault(job_id, []).append((loop, q))
+            q.put_nowait(dict(job))               # current state first
+        return q
+
+    def unsubscribe(self, job_id: str, q: asyncio.Queue) -> None:
+        """Detach a queue previously returned by :meth:`subscribe`."""
+        shard = self._shard(job_id)
+        with shard.lock:
+            subs = [s for s in shard.subscribers.get(job_id, ()) if s[1] is not q]
+            if subs:
+                shard.subscribers[job_id] = subs
+            else:
+                shard.subscribers.pop(job_id, None)
+
+    @staticmethod
+    def _publish(loop: asyncio.AbstractEventLoop, q: asyncio.Queue, snapshot: Dict[str, Any]) -> None:
+        def put_latest() -> None:
+            if q.full():
+                q.get_nowait()                    # drop the stale snapshot
+            q.put_nowait(snapshot)
+        try:
+            loop.call_soon_threadsafe(put_latest)
+        except RuntimeError:                      # loop already closed
+            pass
 
     # ───────────────────────── housekeeping ─────────────────────────
-    def cleanup(self, older_than_sec: int = 24 * 3600) -> None:
+    def cleanup(self, older_than_sec: int | None = None) -> None:
         """
-        Delete finished jobs that are older than *older_than_sec* seconds.
-        Call this periodically (e.g. in /status or via a cron).
+        Delete finished jobs that are older than *older_than_sec* seconds
+        (default: the registry's ttl). If the registry still holds more than
+        *max_jobs*, the oldest finished jobs are evicted as well.
+        Runs automatically from :meth:`create`.
         """
+        ttl = self._ttl_sec if older_than_sec is None else older_than_sec
+        self._evict(ttl, limit=self._max_jobs)
+
+    def _evict(self, ttl: float, limit: int) -> None:
         now = time.time()
-        with self._lock:
-            for jid, job in list(self._jobs.items()):
-                if job["state"] in {"done", "error"} and now - job["created_at"] > older_than_sec:
-                    self._jobs.pop(jid, None)
+        finished: List[tuple] = []
+        removed: List[tuple] = []
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                for jid, job in list(shard.jobs.items()):
+                    if job["state"] not in FINAL_STATES:
+                        continue
+                    if now - job["created_at"] > ttl:
+                        removed.append(self._pop_locked(shard, jid))
+                    else:
+                        finished.append((job["created_at"], jid))
+                total += len(shard.jobs)
+        for r in removed:
+            self._notify_removed(r)
+
+        excess = total - limit
+        if excess > 0:
+            for _, jid in sorted(finished)[:excess]:
+                self.delete(jid)
+        self._last_cleanup = now
+
+    def _auto_cleanup(self) -> None:
+        """Run :meth:`cleanup` when the ttl check is due or the cap is reached."""
+        due = time.time() - self._last_cleanup > min(self._ttl_sec, 3600)
+        if due or len(self) >= self._max_jobs:
+            self._evict(self._ttl_sec, limit=self._max_jobs - 1)   # room for the new job
+
+    def __len__(self) -> int:
+        return sum(len(shard.jobs) for shard in self._shards)
 
 # ---------------------------------------------------------------------------
 # Global singleton – import `jobs` wherever you need to read/update progress.
@@ -1,7 +1,9 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request, status, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import os, shutil, pathlib
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import BinaryIO
+import os, pathlib, json, asyncio, hashlib, tempfile
 from pydantic import BaseModel
 from typing import List
 from llm_loader import get_llm
@@ -14,15 +16,65 @@ import psycopg2
 from embedding_model import get_embedding, get_embedding_with_metadata
 #from rag import vectorstore
 import pgvectorstore as vectorstore
-from tasks import process_pdf
-from job_registry import jobs
+from tasks import process_pdf, UploadBuffer
+from parser import count_pdf_pages
+from job_registry import jobs, FINAL_STATES
+from context_builder import build_context
 
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 origins = os.getenv("FRONTEND_ORIGINS", "").split(",")
 print("🔓 CORS allowed origins:", origins)
 
+UPLOAD_DIR = pathlib.Path("data/docs")
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+# Upload limits
+UPLOAD_CHUNK_SIZE = 1024 * 1024                                   # 1 MiB per read
+MAX_UPLOAD_BYTES  = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+MAX_UPLOAD_PAGES  = int(os.getenv("MAX_UPLOAD_PAGES", "1000"))
+MULTIPART_OVERHEAD = 64 * 1024                                    # boundaries + part headers
+
+class UploadLimitMiddleware:
+    """
+    Enforces MAX_UPLOAD_BYTES on /upload before Starlette parses (and spools
+    to disk) the multipart body: requests with a larger Content-Length are
+    rejected without reading the body, and bodies without one are counted
+    as they arrive and aborted once they exceed the limit.
+    """
+    def __init__(self, app, path: str = "/upload") -> None:
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.app(scope, receive, send)
+
+        limit = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD
+        too_large = f"File exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit."
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": too_large}, status_code=413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(413, too_large)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
 app = FastAPI()
 
+# added before CORS so that 413 responses still carry the CORS headers
+app.add_middleware(UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -31,33 +83,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOAD_DIR = pathlib.Path("data/docs")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 @app.get("/")
 def read_root():
     return {"message": "Hello from ctrl-fpp!"}
 
+def save_upload(src: BinaryIO) -> tuple[pathlib.Path, bytearray]:
+    """
+    Copies *src* in fixed-size chunks into a temp file while hashing it,
+    aborting as soon as MAX_UPLOAD_BYTES is exceeded and rejecting PDFs with
+    more than MAX_UPLOAD_PAGES pages. The finished file is
+    atomically renamed to a content-addressed path (<sha256>.pdf), so
+    concurrent uploads with the same name never overwrite each other.
+    Returns the final path and the file contents.
+    Blocking – run it in the threadpool, not on the event loop.
+    """
+    digest = hashlib.sha256()
+    data = bytearray()                    # the only full-size copy in memory
+    tmp = tempfile.NamedTemporaryFile(dir=UPLOAD_DIR, suffix=".part", delete=False)
+    tmp_path = pathlib.Path(tmp.name)
+    try:
+        with tmp:
+            while chunk := src.read(UPLOAD_CHUNK_SIZE):
+                if not data and not chunk.startswith(b"%PDF"):
+                    raise HTTPException(400, "Only PDF files are supported.")
+                if len(data) + len(chunk) > MAX_UPLOAD_BYTES:
+                    raise HTTPException(413, f"File exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit.")
+                digest.update(chunk)
+                data += chunk
+                tmp.write(chunk)
+        if not data:
+            raise HTTPException(400, "Uploaded file is empty.")
+
+        # page limit is checked on the buffer before the file is kept
+        try:
+            page_count = count_pdf_pages(data)
+        except Exception as exc:
+            raise HTTPException(400, f"Could not read PDF: {exc}") from exc
+        if page_count > MAX_UPLOAD_PAGES:
+            raise HTTPException(413, f"PDF has {page_count} pages, limit is {MAX_UPLOAD_PAGES}.")
+
+        file_path = UPLOAD_DIR / f"{digest.hexdigest()}.pdf"
+        os.replace(tmp_path, file_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return file_path, data
+
 @app.post("/upload", status_code=202, response_model=None)
 async def upload_file(    
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
 ):
     """
-    1. Saves the uploaded PDF to disk.
+    1. Streams the uploaded PDF to disk (size/page limits, content-addressed path).
+       The request size itself is capped by UploadLimitMiddleware.
     2. Registers a new JobRegistry entry → returns job_id immediately.
-    3. Schedules background parsing/embedding.
+    3. Schedules background parsing/embedding on the in-memory buffer.
     """
     # ----- basic validation ---------------------------------------------------
     fname = file.filename or "unnamed.pdf"
     if not fname.lower().endswith(".pdf"):
         raise HTTPException(400, "Only PDF files are supported.")
 
-    file_path = UPLOAD_DIR / fname
     # ----- persist the file ---------------------------------------------------
     try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        file_path, data = await run_in_threadpool(save_upload, file.file)
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(500, f"Could not write file: {exc}") from exc
 
@@ -65,7 +156,7 @@ async def upload_file(
     job_id = jobs.create(fname)          # state = "queued", progress = 0.0
 
     # ----- hand off to background worker -------------------------------------
-    background_tasks.add_task(process_pdf, job_id, fname, str(file_path))
+    background_tasks.add_task(process_pdf, job_id, fname, str(file_path), UploadBuffer(data))
 
     # ----- immediate 202 Accepted response ------------------------------------
     return JSONResponse(
@@ -103,8 +194,10 @@ async def ask_docs(req: AskRequest, request: Request):
             print("⚡ No keyword match, falling back to pure vector search")
             results = vectorstore.search(q_embedding, top_k=3)
 
-        # 3) Build context
-        context = "\n\n".join([r["chunk"] for r in results])
+        # 3) Build context (merged, de-duplicated, token-budgeted)
+        context, context_stats = build_context(results)
+        print(f"✂️ Context: {context_stats['context_tokens']} of {context_stats['raw_tokens']} tokens "
+              f"(dedup saved {context_stats['dedup_saved']}, truncated {context_stats['truncated']})")
 
         prompt = f"""
         You are a helpful assistant answering questions based on provided document excerpts (context).
@@ -145,7 +238,8 @@ async def ask_docs(req: AskRequest, request: Request):
         return {
             "question": req.question,
             "answer": answer_text,
-            "sources": results
+            "sources": results,
+            "context_stats": context_stats,
         }
 
     except Exception as e:
@@ -235,4 +329,39 @@ def check_status(job_id: str):
     job = jobs.get(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return job
\ No newline at end of file
+    return job
+
+SSE_KEEPALIVE_SEC = 15
+
+@app.get("/status/{job_id}/stream")
+async def stream_status(job_id: str, request: Request):
+    """
+    Server-Sent Events stream of job snapshots. Pushes the current state
+    immediately, then every published change until the job is done/error.
+    """
+    queue = jobs.subscribe(job_id)
+    if queue is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        try:
+            while True:
+                try:
+                    job = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+
+                yield f"data: {json.dumps(job)}\n\n"
+                if job["state"] in FINAL_STATES:
+                    break
+        finally:
+            jobs.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,18 +1,39 @@
 import fitz  # PyMuPDF
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional, Union
 
-def parse_pdf_pages(pdf_path: str) -> List[Dict]:
+def open_pdf(pdf: Union[str, bytes, bytearray]) -> fitz.Document:
     """
-    Reads the PDF from pdf_path and returns a list of dicts,
-    where each dict is: {"page": page_num, "text": page_text}.
+    Opens a PDF either from a file path or from an in-memory buffer,
+    so freshly uploaded files don't have to be read back from disk.
     """
-    doc = fitz.open(pdf_path)
+    if isinstance(pdf, (bytes, bytearray)):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(pdf)
+
+def count_pdf_pages(pdf: Union[str, bytes, bytearray]) -> int:
+    """Returns the number of pages without extracting any text."""
+    with open_pdf(pdf) as doc:
+        return doc.page_count
+
+def parse_pdf_pages(
+    pdf: Union[str, bytes, bytearray],
+    on_page: Optional[Callable[[int, int], None]] = None,
+) -> List[Dict]:
+    """
+    Reads the PDF from a file path or an in-memory buffer and returns a list
+    of dicts, where each dict is: {"page": page_num, "text": page_text}.
+    If given, on_page(page_num, total_pages) is called after each page.
+    """
+    doc = open_pdf(pdf)
+    total_pages = doc.page_count
     parsed_pages = []
 
     for page_num, page in enumerate(doc, start=1):
         text = page.get_text("text")
         # Store both text and page number
         parsed_pages.append({"page": page_num, "text": text})
+        if on_page:
+            on_page(page_num, total_pages)
 
     doc.close()
     return parsed_pages
@@ -19,18 +19,34 @@ def _segment(base: float, span: float, frac: float) -> float:
     return round(base + span * frac, 3)
 
 
-def process_pdf(job_id: str, filename: str, file_path: str) -> None:
+class UploadBuffer:
+    """
+    Owns the bytes of a fresh upload until the parser takes them. Background
+    task arguments live for the whole run, so passing the raw bytes would
+    keep them in memory during embedding; the buffer is emptied instead.
+    """
+    def __init__(self, data: bytearray) -> None:
+        self._data: bytearray | None = data
+
+    def take(self) -> bytearray | None:
+        """Return the bytes (once) and drop the buffer's own reference."""
+        data, self._data = self._data, None
+        return data
+
+
+def process_pdf(job_id: str, filename: str, file_path: str, upload: UploadBuffer | None = None) -> None:
     """
     Parse → chunk → embed → store, emitting fine‑grained progress so the
     front‑end bar moves continuously.
-    Called via:   background_tasks.add_task(process_pdf, job_id, fname, path)
+    If *upload* is given, the PDF is parsed from memory instead of being
+    re-read from *file_path*, and the bytes are released once parsed.
+    Called via:   background_tasks.add_task(process_pdf, job_id, fname, path, UploadBuffer(data))
     """
     try:
         # ── 1. Parse pages ───────────────────────────────────────────────────
-        pages = parse_pdf_pages(file_path)
-        total_pages = len(pages)
-
-        for idx, page in enumerate(pages, 1):
+        # progress is reported while PyMuPDF walks the pages; the registry
+        # coalesces these updates, so a per-page call is cheap
+        def on_page(idx: int, total_pages: int) -> None:
             jobs.update(
                 job_id,
                 state="parsing",
@@ -38,6 +54,10 @@ def process_pdf(job_id: str, filename: str, file_path: str) -> None:
                 progress=_segment(0.0, PARSE_WEIGHT, idx / total_pages),
             )
 
+        data = upload.take() if upload else None
+        pages = parse_pdf_pages(data if data is not None else file_path, on_page=on_page)
+        del data
+
         # ── 2. Chunk pages ───────────────────────────────────────────────────
         # 2) Chunk pages – emit per‑page progress
         jobs.update(job_id, state="chunking")
@@ -3,6 +3,9 @@ import axios from 'axios'
 import { Typography, Button, Box, LinearProgress, Paper } from '@mui/material'
 import UploadFileIcon from '@mui/icons-material/UploadFile'
 
+const MAX_STREAM_RETRIES = 5 // reopen attempts after the stream closed for good
+const RETRY_BASE_MS = 1_000 // backoff: 1 s, 2 s, 4 s, …
+
 interface FileUploaderProps {
   onUploadSuccess?: () => void // refresh docs list in <App>
 }
@@ -14,15 +17,14 @@ interface JobStatus {
   error?: string
 }
 
-const POLL_MS = 1_000 // how often to poll /status/<job_id>
-
 export default function FileUploader({ onUploadSuccess }: FileUploaderProps) {
   const [, setMessage] = useState<string>('')
   const [uploading, setUploading] = useState<boolean>(false)
   const [, setJobId] = useState<string | null>(null)
   const [status, setStatus] = useState<JobStatus | null>(null)
 
-  const timerRef = useRef<ReturnType<typeof setInterval> | null>(null)
+  const sourceRef = useRef<EventSource | null>(null)
+  const retryRef = useRef<ReturnType<typeof setTimeout> | null>(null)
 
   const backend = import.meta.env.VITE_BACKEND_URL
 
@@ -33,31 +35,61 @@ export default function FileUploader({ onUploadSuccess }: FileUploaderProps) {
   const barValue = status ? Math.round((status.progress ?? 0) * 100) : 0
   // ────────────────────────────────────────────────────────────────────
 
-  const startPolling = (id: string) => {
-    timerRef.current = setInterval(async () => {
+  // server pushes job snapshots via SSE on /status/<job_id>/stream
+  const subscribe = (id: string, attempt = 0) => {
+    sourceRef.current?.close()
+    const source = new EventSource(`${backend}/status/${id}/stream`)
+    sourceRef.current = source
+
+    const handleStatus = (data: JobStatus) => {
+      setStatus(data)
+
+      if (['done', 'error'].includes(data.state)) {
+        source.close()
+        if (data.state === 'done') {
+          setMessage('✅ Verarbeitung abgeschlossen')
+          onUploadSuccess?.()
+        } else {
+          setMessage(`⚠️ Fehler: ${data.error}`)
+        }
+      }
+    }
+
+    source.onmessage = (event) => {
+      attempt = 0 // stream works again – reset the backoff
+      handleStatus(JSON.parse(event.data))
+    }
+
+    // transient drops are retried by EventSource itself; only when it gives
+    // up for good, ask /status/<job_id> once and reopen the stream with
+    // exponential backoff (at most MAX_STREAM_RETRIES times)
+    source.onerror = async (err) => {
+      if (source.readyState !== EventSource.CLOSED) return
+      console.error('Status stream closed', err)
       try {
         const res = await axios.get<JobStatus>(`${backend}/status/${id}`)
-        setStatus(res.data)
-
-        if (['done', 'error'].includes(res.data.state)) {
-          clearInterval(timerRef.current!)
-          if (res.data.state === 'done') {
-            setMessage('✅ Verarbeitung abgeschlossen')
-            onUploadSuccess?.()
-          } else {
-            setMessage(`⚠️ Fehler: ${res.data.error}`)
-          }
+        handleStatus(res.data)
+        if (['done', 'error'].includes(res.data.state)) return
+        if (attempt >= MAX_STREAM_RETRIES) {
+          setMessage('⚠️ Statusabfrage fehlgeschlagen')
+          return
         }
-      } catch (err) {
-        console.error('Status polling failed', err)
-        clearInterval(timerRef.current!)
+        retryRef.current = setTimeout(() => subscribe(id, attempt + 1), RETRY_BASE_MS * 2 ** attempt)
+      } catch (statusErr) {
+        console.error('Status request failed', statusErr)
         setMessage('⚠️ Statusabfrage fehlgeschlagen')
       }
-    }, POLL_MS)
+    }
   }
 
   // clean‑up on unmount
-  useEffect(() => () => clearInterval(timerRef.current!), [])
+  useEffect(
+    () => () => {
+      sourceRef.current?.close()
+      clearTimeout(retryRef.current!)
+    },
+    []
+  )
 
   const handleFileChange = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0]
@@ -78,7 +110,7 @@ export default function FileUploader({ onUploadSuccess }: FileUploaderProps) {
 
       setJobId(res.data.job_id)
       setMessage(res.data.message)
-      startPolling(res.data.job_id)
+      subscribe(res.data.job_id)
     } catch (err: any) {
       console.error('Upload error', err)
       setMessage(